@@ -1,12 +1,18 @@
+import atexit
 import json
 import os
+import queue
 import asyncio
 import random
+import re
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
+from urllib.parse import urlparse
 
 # Playwright imports
 from playwright.async_api import (
+    Error as PlaywrightError,
     Page,
     TimeoutError as PlaywrightTimeoutError,
     Locator,
@@ -14,55 +20,106 @@ from playwright.async_api import (
 )
 
 # --- Set up logging ---
+# Records are queued by the caller and written to disk by a listener thread,
+# so file I/O never blocks the event loop.
 log_file = "instagram_server.log"
+_file_handler = logging.FileHandler(log_file)
+_file_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+)
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    format="%(message)s",  # Prefix is added by _file_handler
     handlers=[
-        logging.FileHandler(log_file),
+        QueueHandler(_log_queue),
     ],
 )
 logger = logging.getLogger(__name__)
 # ---------------------
 
+_POST_SLUG_RE = re.compile(r"/(?:p|reel)/([^/?#]+)")
+
+
+def _post_slug(url: Optional[str]) -> str:
+    """Return the shortcode of a post/reel URL, or 'post' if there isn't one."""
+    match = _POST_SLUG_RE.search(url or "")
+    return match.group(1) if match else "post"
+
+
+def _is_feed_url(url: str) -> bool:
+    """True if url is the Instagram home feed (not a post, reel, story, profile, about:blank...)."""
+    parsed = urlparse(url)
+    return parsed.netloc.endswith("instagram.com") and parsed.path in ("", "/")
+
+
+_HEAVY_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+
+
+async def _block_heavy_resources(route) -> None:
+    if route.request.resource_type in _HEAVY_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
 class InstagramServer:
+    # Selector table shared by all instances; built once at class creation
+    SELECTORS = {
+        'feed': {
+            'content': "main[role='main']",
+            'first_article': "main[role='main'] article:first-of-type",
+            'more_options': 'internal:role=button[name="More options"i]',
+            'modal': {
+                'go_to_post': 'internal:role=button[name="Go to post"i]'
+            }
+        },
+        'post': {
+            'like': 'internal:role=button[name="Like"i][exact=true]', # Updated selector
+            'unlike': 'internal:role=button[name="Unlike"i][exact=true]', # Updated selector
+            'comment_button': 'article div[role="button"]:has(svg[aria-label="Comment"]), main div[role="button"]:has(svg[aria-label="Comment"])',
+            'comment_input': 'textarea[aria-label="Add a comment…"]',
+            'submit': 'div[role="button"]:text-is("Post")'
+        },
+        'stories': {
+            'first': 'div[role="button"][aria-label^="Story by"][tabindex="0"]',
+            'next': 'div[role="dialog"] button[aria-label="Next"]',
+            'previous': 'div[role="dialog"] button[aria-label="Previous"]',
+            'pause': 'div[role="dialog"] div[role="button"]:has(svg[aria-label="Pause"])',
+            'play': 'div[role="dialog"] div[role="button"]:has(svg[aria-label="Play"])',
+            'like': 'div[role="dialog"] svg[aria-label="Like"]',
+            'unlike': 'div[role="dialog"] svg[aria-label="Unlike"]',
+            'reply_input': 'div[role="dialog"] textarea[placeholder^="Reply to"]',
+            'close': 'internal:role=button[name="Close"i][exact=true]', # Updated selector
+            'viewer': 'div[role="dialog"]'
+        }
+    }
+
     def __init__(self):
+        self.playwright = None
         self.browser = None
         self.context = None
         self.page: Optional[Page] = None
         self.cookies_path = os.path.join(
             os.path.dirname(__file__), "cookies", "instagram.json"
         )
+        self._cookies_cache: Optional[tuple] = None  # (mtime, cookies)
+        self._locators: dict = {}  # (group, name) -> Locator, see _bind_locators()
+        self._ready = False
+        self._over_cdp = False
+        self._init_lock = asyncio.Lock()
+        # Tools share one page, so run them one at a time
+        self.tool_semaphore = asyncio.Semaphore(1)
         logger.info("InstagramServer instance created.")
-        self.selectors = {
-            'feed': {
-                'content': "main[role='main']",
-                'first_article': "main[role='main'] article:first-of-type",
-                'more_options': 'internal:role=button[name="More options"i]',
-                'modal': {
-                    'go_to_post': 'button:has-text("Go to post")'
-                }
-            },
-            'post': {
-                'like': 'internal:role=button[name="Like"i][exact=true]', # Updated selector
-                'unlike': 'internal:role=button[name="Unlike"i][exact=true]', # Updated selector
-                'comment_button': 'article div[role="button"]:has(svg[aria-label="Comment"]), main div[role="button"]:has(svg[aria-label="Comment"])',
-                'comment_input': 'textarea[aria-label="Add a comment…"]',
-                'submit': 'div[role="button"]:text-is("Post")'
-            },
-            'stories': {
-                'first': 'div[role="button"][aria-label^="Story by"][tabindex="0"]',
-                'next': 'div[role="dialog"] button[aria-label="Next"]',
-                'previous': 'div[role="dialog"] button[aria-label="Previous"]',
-                'pause': 'div[role="dialog"] div[role="button"]:has(svg[aria-label="Pause"])',
-                'play': 'div[role="dialog"] div[role="button"]:has(svg[aria-label="Play"])',
-                'like': 'div[role="dialog"] svg[aria-label="Like"]',
-                'unlike': 'div[role="dialog"] svg[aria-label="Unlike"]',
-                'reply_input': 'div[role="dialog"] textarea[placeholder^="Reply to"]',
-                'close': 'internal:role=button[name="Close"i][exact=true]', # Updated selector
-                'viewer': 'div[role="dialog"]'
-            }
-        }
+        self.selectors = self.SELECTORS
 
     def _ensure_page(self) -> Page:
         if not self.page:
@@ -70,15 +127,43 @@ class InstagramServer:
             raise ValueError("Page object is not initialized. Call init() first.")
         return self.page
 
+    def _locator(self, group: str, name: str) -> Locator:
+        """Return the Locator bound for self.selectors[group][name] on the current page."""
+        self._ensure_page()
+        return self._locators[(group, name)]
+
+    def locator(self, group: str, name: str) -> Locator:
+        """Public access to the bound selector Locators (used by server.py)."""
+        return self._locator(group, name)
+
+    def _bind_locators(self):
+        """Build the Locator for every (group, name) selector once for the new page."""
+        self._locators = {
+            (group, name): self.page.locator(selector)
+            for group, entries in self.selectors.items()
+            for name, selector in entries.items()
+            if isinstance(selector, str)
+        }
+
+    def _read_cookies(self) -> list:
+        with open(self.cookies_path, "r") as f:
+            return json.load(f)
+
     async def load_cookies(self):
         if not self.context:
             logger.error("Cannot load cookies, browser context not initialized.")
             return False
         if os.path.exists(self.cookies_path):
             try:
-                # Keep json import for this
-                with open(self.cookies_path, "r") as f:
-                    cookies = json.load(f)
+                # Re-parse the cookie file only when it changed on disk
+                mtime = os.path.getmtime(self.cookies_path)
+                if self._cookies_cache and self._cookies_cache[0] == mtime:
+                    cookies = self._cookies_cache[1]
+                    logger.debug("Using cached cookies for %s", self.cookies_path)
+                else:
+                    # Parse off the event loop so browser callbacks aren't stalled
+                    cookies = await asyncio.to_thread(self._read_cookies)
+                    self._cookies_cache = (mtime, cookies)
                 await self.context.add_cookies(cookies)
                 logger.info("Cookies loaded successfully from %s", self.cookies_path)
                 return True
@@ -92,32 +177,187 @@ class InstagramServer:
         logger.warning("Cookie file not found at %s", self.cookies_path)
         return False
 
+    async def _seed_profile_cookies(self) -> bool:
+        """Load the cookie file into a persistent profile only if it has no session yet."""
+        existing = await self.context.cookies("https://www.instagram.com")
+        if any(cookie["name"] == "sessionid" for cookie in existing):
+            logger.info("Persistent profile already has an Instagram session, not loading cookies.")
+            return False
+        if await self.load_cookies():
+            logger.info("Seeded persistent profile with cookies from %s", self.cookies_path)
+            return True
+        logger.warning("Persistent profile has no Instagram session; running logged out.")
+        return False
+
     async def init(self):
-        # This method remains largely the same, just logging adjusted slightly
-        if self.browser:
-            logger.debug("Browser already initialized.")
+        # Fast path: every tool calls init(), only the first one launches.
+        # Synchronous checks only, so a warm call never yields to the loop.
+        if self._ready and not self.page.is_closed():
             return
-
-        playwright = await async_playwright().start()
+        async with self._init_lock:
+            if self._ready:
+                if not self.page.is_closed():
+                    logger.debug("Browser already initialized.")
+                    return
+                # Window closed by hand or browser crashed: start over
+                logger.warning("Browser page is closed, relaunching...")
+                await self.close()
+            try:
+                await self._launch()
+            except Exception:
+                # Don't leave a half-built browser behind for the next attempt
+                await self.close()
+                raise
+            self._ready = True
+
+    async def _launch(self):
+        # Attach over CDP, open a persistent profile, or launch a fresh browser,
+        # then set up the page. The Playwright driver outlives close() so
+        # re-init only relaunches Chromium.
+        if not self.playwright:
+            logger.info("Starting Playwright driver...")
+            self.playwright = await async_playwright().start()
+        playwright = self.playwright
         window_width = 900
         window_height = 1000
+        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+
+        # Attach to an already-running Chrome (started with
+        # --remote-debugging-port) to skip the browser cold start entirely
+        cdp_url = os.environ.get("CDP_URL")
+        # A persistent profile keeps Instagram's HTTP cache and session
+        # across server restarts
+        user_data_dir = os.environ.get("IG_USER_DATA_DIR")
+        if cdp_url:
+            logger.info("Connecting to running Chrome over CDP at %s", cdp_url)
+            try:
+                self.browser = await playwright.chromium.connect_over_cdp(cdp_url)
+                self._over_cdp = True
+            except Exception as e:
+                # Chrome not listening (yet): launch our own instead of failing
+                logger.warning(
+                    "Could not connect over CDP at %s, launching a browser instead: %s",
+                    cdp_url,
+                    e,
+                )
+                self._over_cdp = False
+        if not self._over_cdp:
+            await self._launch_browser(
+                playwright, window_width, window_height, user_agent, user_data_dir
+            )
+
+        # Set when the context already carries its own Instagram session
+        reuse_session = False
+        if self.context is not None:
+            # Persistent profile: the context was created with the browser
+            # and keeps the session saved in user_data_dir
+            logger.info("Using persistent browser context...")
+            reuse_session = True
+        elif self._over_cdp and self.browser.contexts:
+            # Reuse the running profile's context (and its logged-in session)
+            logger.info("Reusing existing browser context...")
+            self.context = self.browser.contexts[0]
+            reuse_session = True
+        else:
+            logger.info("Creating browser context...")
+            self.context = await self.browser.new_context(
+                viewport={"width": window_width, "height": window_height},
+                user_agent=user_agent,
+            )
+        # Cookies only need the context, so add them while the page is set up.
+        # Never inject them into the user's running Chrome: that could replace
+        # a newer session with the stale cookie file.
+        cookies_task = None
+        if self._over_cdp and reuse_session:
+            logger.info("Reused context keeps its own session, not loading cookies.")
+        elif reuse_session:
+            cookies_task = asyncio.create_task(self._seed_profile_cookies())
+        else:
+            cookies_task = asyncio.create_task(self.load_cookies())
+        try:
+            if self.browser is None and self.context.pages:
+                # launch_persistent_context already opened a tab; use it
+                self.page = self.context.pages[0]
+            else:
+                logger.info("Creating new page...")
+                self.page = await self.context.new_page()
+            self._bind_locators()
+            logger.info("Setting extra HTTP headers...")
+            await self.page.set_extra_http_headers(
+                {
+                    "Accept-Language": "en-US,en;q=0.9",
+                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+                }
+            )
+        finally:
+            if cookies_task:
+                await cookies_task
+
+        if os.environ.get("BLOCK_HEAVY") == "1":
+            # Opt-in: skip images/video/fonts, none of which the selectors need.
+            # Routing sends every request (JS/XHR too) through Python and turns
+            # off the page's HTTP cache, so skip it for reused or persistent
+            # profiles, whose cached bundles are worth more than the savings.
+            if reuse_session:
+                logger.info("BLOCK_HEAVY ignored: keeping the profile's HTTP cache.")
+            else:
+                logger.info("Blocking heavy resources (%s)...", ", ".join(sorted(_HEAVY_RESOURCE_TYPES)))
+                await self.page.route("**/*", _block_heavy_resources)
+
+        def handle_page_error(error):
+            logger.error("FATAL PAGE ERROR (JavaScript): %s", error)
+
+        self.page.on("pageerror", handle_page_error)
+
+        def handle_console_message(msg):
+            if msg.type.lower() in ["error", "warning"]:
+                logger.warning("BROWSER CONSOLE [%s]: %s", msg.type.upper(), msg.text)
+
+        self.page.on("console", handle_console_message)
+
+        logger.info("Browser and page initialization complete.")
 
+    async def _launch_browser(
+        self,
+        playwright,
+        window_width: int,
+        window_height: int,
+        user_agent: str,
+        user_data_dir: Optional[str] = None,
+    ):
+        """Launch Chrome (falling back to bundled Chromium) as self.browser,
+        or as a persistent self.context when user_data_dir is given."""
         chrome_executable_path = (
             r"C:\Program Files\Google\Chrome\Application\chrome.exe"
         )
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+        # Visible window by default; HEADLESS=1 for unattended/container runs
+        headless = os.environ.get("HEADLESS") == "1"
+        args = [
+            f"--window-size={window_width},{window_height}",
+            "--disable-blink-features=AutomationControlled",
+            "--disable-dev-shm-usage",
+        ]
+
+        async def launch(**kwargs):
+            if user_data_dir:
+                self.context = await playwright.chromium.launch_persistent_context(
+                    user_data_dir,
+                    headless=headless,
+                    viewport={"width": window_width, "height": window_height},
+                    user_agent=user_agent,
+                    **kwargs,
+                )
+            else:
+                self.browser = await playwright.chromium.launch(
+                    headless=headless, **kwargs
+                )
 
-        logger.info("Initializing browser...")
+        logger.info("Initializing browser (headless=%s)...", headless)
+        if user_data_dir:
+            logger.info("Using persistent browser profile from %s", user_data_dir)
         logger.info("Attempting to launch Chrome from: %s", chrome_executable_path)
         try:
-            self.browser = await playwright.chromium.launch(
-                executable_path=chrome_executable_path,
-                headless=False,
-                args=[
-                    f"--window-size={window_width},{window_height}",
-                    "--disable-blink-features=AutomationControlled",
-                ],
-            )
+            await launch(executable_path=chrome_executable_path, args=args)
             logger.info("Launched successfully using specified Chrome executable.")
         except Exception as e:
             logger.error(
@@ -127,15 +367,7 @@ class InstagramServer:
             )
             logger.info("Falling back to default Chromium launch.")
             try:
-                self.browser = await playwright.chromium.launch(
-                    headless=False,
-                    args=[
-                        f"--window-size={window_width},{window_height}",
-                        "--disable-gpu",
-                        "--disable-blink-features=AutomationControlled",
-                    ],
-                    chromium_sandbox=False,
-                )
+                await launch(args=[*args, "--disable-gpu"], chromium_sandbox=False)
                 logger.info("Launched successfully using default Chromium fallback.")
             except Exception as fallback_e:
                 logger.critical(
@@ -144,60 +376,66 @@ class InstagramServer:
                 )
                 raise fallback_e
 
-        logger.info("Creating browser context...")
-        self.context = await self.browser.new_context(
-            viewport={"width": window_width, "height": window_height},
-            user_agent=user_agent,
-        )
-        await self.load_cookies()
-        logger.info("Creating new page...")
-        self.page = await self.context.new_page()
-        logger.info("Setting extra HTTP headers...")
-        await self.page.set_extra_http_headers(
-            {
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            }
-        )
-
-        def handle_page_error(error):
-            logger.error("FATAL PAGE ERROR (JavaScript): %s", error)
-
-        self.page.on("pageerror", handle_page_error)
-
-        def handle_console_message(msg):
-            if msg.type.lower() in ["error", "warning"]:
-                logger.warning("BROWSER CONSOLE [%s]: %s", msg.type.upper(), msg.text)
-
-        self.page.on("console", handle_console_message)
-
-        logger.info("Browser and page initialization complete.")
-
     async def close(self):
-        # This method is fine
-        if self.browser:
+        # Tear down the browser but keep the Playwright driver (see shutdown())
+        self._ready = False
+        if self.browser or self.context:
+            if self._over_cdp:
+                # browser.close() only disconnects from a CDP browser, so drop
+                # our own tab explicitly and leave the user's Chrome running
+                if self.page and not self.page.is_closed():
+                    await self.page.close()
+                self._over_cdp = False
             logger.info("Closing browser...")
-            await self.browser.close()
+            if self.browser:
+                await self.browser.close()
+            else:
+                # Persistent contexts have no Browser object; closing the
+                # context shuts the browser down
+                await self.context.close()
             self.browser = None
             self.context = None
             self.page = None
+            self._locators.clear()
             logger.info("Browser closed.")
         else:
             logger.info("Browser already closed or not initialized.")
 
+    async def shutdown(self):
+        """Close the browser and stop the Playwright driver (server exit)."""
+        await self.close()
+        if self.playwright:
+            logger.info("Stopping Playwright driver...")
+            await self.playwright.stop()
+            self.playwright = None
+
     # --- Helper Methods ---
 
     async def _wait_for_post_content(self, page: Page) -> None:
         """Wait for critical post elements to be present."""
         logger.debug("Waiting for post content to stabilize (like button or comment input)...")
-        post_like_btn = page.locator(self.selectors["post"]["like"])
-        post_comment_input = page.locator(self.selectors["post"]["comment_input"])
+        post_like_btn = self._locator("post", "like")
+        post_comment_input = self._locator("post", "comment_input")
         # Wait for either the like button OR the comment input to be visible
         await post_like_btn.or_(post_comment_input).first.wait_for(state="visible", timeout=30000) # Already uses "visible"
         await asyncio.sleep(0.5)  # Short stabilization period
         logger.debug("Post content stabilized.")
 
 
+    async def _return_to_feed(self, page: Page) -> None:
+        """Go back to the main feed, preferring history navigation over a fresh load."""
+        try:
+            # History navigation can be served from the back/forward cache
+            await page.go_back(wait_until="domcontentloaded", timeout=3000)
+        except PlaywrightError as e:
+            # Timeouts, aborted/interrupted navigations, SPA redirects mid-back:
+            # the URL check below decides whether a full load is still needed
+            logger.debug("go_back failed (%s), checking where we ended up.", e)
+        if not _is_feed_url(page.url):
+            logger.debug("History did not lead to the feed (%s), loading it.", page.url)
+            await page.goto("https://www.instagram.com/", wait_until="domcontentloaded", timeout=30000)
+        await self._locator("feed", "content").wait_for(state="visible", timeout=15000)
+
     # --- Feed Actions ---
 
     async def open_first_post_from_feed(self) -> str:
@@ -206,26 +444,24 @@ class InstagramServer:
         logger.info("Attempting to open the first post from the feed...")
         try:
             # Wait for main feed content directly
-            main_feed = page.locator(self.selectors["feed"]["content"])
+            main_feed = self._locator("feed", "content")
             await main_feed.wait_for(state="visible", timeout=15000)
             logger.debug("Main feed content visible.")
 
             # Get first post article
-            first_article = page.locator(self.selectors["feed"]["first_article"])
+            first_article = self._locator("feed", "first_article")
             await first_article.wait_for(state="visible", timeout=10000)
             logger.debug("First post article visible.")
 
-            # Click more options
+            # Click more options (click() auto-waits for the button to be actionable)
             more_options = first_article.locator(self.selectors["feed"]["more_options"])
-            await more_options.wait_for(state="visible", timeout=7000)
-            logger.debug("More options button visible. Clicking...")
-            await more_options.click(timeout=5000)
+            logger.debug("Clicking more options button...")
+            await more_options.click(timeout=12000)
 
             # Click go to post
             go_to_post = page.locator(self.selectors["feed"]["modal"]["go_to_post"])
-            await go_to_post.wait_for(state="visible", timeout=5000) # Added wait_for visible
-            logger.debug("'Go to post' button visible. Clicking...")
-            await go_to_post.click(timeout=5000)
+            logger.debug("Clicking 'Go to post' button...")
+            await go_to_post.click(timeout=10000)
 
             # --- MODIFIED WAIT LOGIC ---
             logger.debug("Waiting for post content to load after clicking 'Go to post'...")
@@ -249,35 +485,33 @@ class InstagramServer:
         # Updated method based on user request
         page = self._ensure_page()
         action_description = f"like post at {post_url}" if post_url else "like current post"
-        logger.info(f"Attempting to {action_description}...")
+        logger.info("Attempting to %s...", action_description)
 
         try:
             if post_url:
                 logger.info("Navigating to post URL: %s", post_url)
                 # Use domcontentloaded and helper wait
-                await page.goto(post_url, wait_until="domcontentloaded", timeout=45000)
+                await page.goto(post_url, wait_until="domcontentloaded", timeout=15000)
                 await self._wait_for_post_content(page)
 
-            # Use get_by_role as requested
-            like_btn = page.get_by_role("button", name="Like", exact=True)
-            unlike_btn = page.get_by_role("button", name="Unlike", exact=True)
+            # Use get_by_role as requested; resolve .first once for the whole action
+            like_btn = page.get_by_role("button", name="Like", exact=True).first
+            unlike_btn = page.get_by_role("button", name="Unlike", exact=True).first
 
-            # Check if already liked using .first and is_visible
-            if await unlike_btn.first.is_visible(timeout=2000):
+            # One wait for whichever button renders, then branch on which it is
+            logger.info("Waiting for like button...")
+            await like_btn.or_(unlike_btn).first.wait_for(state="visible", timeout=10000)
+            if await unlike_btn.is_visible():
                 logger.info("Post already liked")
                 return "Post already liked."
 
-            # Wait for first like button
-            logger.info("Waiting for like button...")
-            await like_btn.first.wait_for(state="visible", timeout=10000)
-
             # Hover and click with precise positioning
             logger.debug("Hovering and clicking like button...")
-            await like_btn.first.hover()
+            await like_btn.hover()
             await asyncio.sleep(0.3)
 
             # Click with position and force to avoid overlays
-            await like_btn.first.click(
+            await like_btn.click(
                 position={"x": 5, "y": 5},
                 timeout=5000,
                 force=True # Added force=True
@@ -285,20 +519,28 @@ class InstagramServer:
 
             # Verify with unlike button
             logger.debug("Verifying like action...")
-            await unlike_btn.first.wait_for(state="visible", timeout=3000)
+            await unlike_btn.wait_for(state="visible", timeout=3000)
             logger.info("Post liked successfully")
             return "Post liked successfully."
 
         except Exception as e:
             logger.error("Like failed. Current URL: %s", page.url)
-            # Diagnostic screenshot
-            screenshot_path = "like_error.png"
+            # Diagnostic screenshot, named per post so failures don't overwrite each other
+            screenshot_path = f"like_error_{_post_slug(post_url or page.url)}.png"
             try:
-                await page.screenshot(path=screenshot_path, full_page=True)
-                logger.info(f"Screenshot saved to {screenshot_path}")
+                # Capture in the browser, write the file off the event loop
+                png = await page.screenshot(full_page=True)
+                await asyncio.to_thread(_write_bytes, screenshot_path, png)
+                logger.info("Screenshot saved to %s", screenshot_path)
             except Exception as ss_e:
-                logger.error(f"Failed to save screenshot: {ss_e}")
-            logger.error("Full error details: %s", str(e), exc_info=True)
+                logger.error("Failed to save screenshot: %s", ss_e)
+            # Timeouts are the expected failure here; only format a traceback
+            # for genuinely unexpected errors
+            logger.error(
+                "Full error details: %s",
+                e,
+                exc_info=not isinstance(e, PlaywrightTimeoutError),
+            )
             return f"Like failed: {str(e)}"
 
 
@@ -310,25 +552,25 @@ class InstagramServer:
         action_description = (
             f"comment on post at {post_url}" if post_url else "comment on current post"
         )
-        logger.info(f"Attempting to {action_description} with text: '{comment_text}'")
+        logger.info("Attempting to %s with text: '%s'", action_description, comment_text)
 
         try:
             if post_url:
                 logger.info("Navigating to post URL: %s", post_url)
                 # Use domcontentloaded and helper wait
-                await page.goto(post_url, wait_until="domcontentloaded", timeout=45000)
+                await page.goto(post_url, wait_until="domcontentloaded", timeout=15000)
                 await self._wait_for_post_content(page)
                 logger.info("Page loaded for post: %s", post_url)
 
             # Optional click on comment icon (attempt, but don't fail)
             try:
-                comment_button = page.locator(self.selectors["post"]["comment_button"])
+                comment_button = self._locator("post", "comment_button")
                 await comment_button.click(timeout=3000)
                 logger.debug("Clicked comment icon (optional step).")
             except Exception:
                 logger.debug("Could not click comment icon or it wasn't necessary.")
 
-            comment_input = page.locator(self.selectors["post"]["comment_input"])
+            comment_input = self._locator("post", "comment_input")
             await comment_input.wait_for(state="visible", timeout=10000)
             logger.debug("Comment input visible. Filling text...")
             # Use fill() as requested
@@ -340,13 +582,23 @@ class InstagramServer:
             logger.debug("Pausing for %.2fs before clicking Post button...", post_delay)
             await asyncio.sleep(post_delay)
 
-            post_btn = page.locator(self.selectors["post"]["submit"])
-            await post_btn.wait_for(state="visible", timeout=5000) # Wait for button
-            logger.debug("Post button visible. Clicking...")
-            await post_btn.click(timeout=5000)
+            # The same text may already be on the page (an earlier identical
+            # comment or the caption), so count matches before submitting
+            posted_comment = page.get_by_text(comment_text, exact=True)
+            existing = await posted_comment.count()
+
+            post_btn = self._locator("post", "submit")
+            logger.debug("Clicking Post button...")
+            await post_btn.click(timeout=10000) # Auto-waits for the button
 
-            # Add delay after posting
-            await asyncio.sleep(random.uniform(1.5, 2.5))
+            # Wait for one more match instead of sleeping a fixed time
+            try:
+                await posted_comment.nth(existing).wait_for(
+                    state="visible", timeout=5000
+                )
+            except PlaywrightTimeoutError:
+                logger.warning("Comment submitted but it did not appear on the page.")
+                return "Comment submitted, but could not verify it was posted."
             logger.info("Comment posted successfully.")
             return "Comment posted successfully."
 
@@ -366,15 +618,21 @@ class InstagramServer:
         page = self._ensure_page()
         logger.info("Attempting to open Instagram stories...")
 
-        # --- Navigate to feed if needed (Simplified check) ---
-        current_url = page.url
-        is_on_feed = "/p/" not in current_url and "/stories/" not in current_url
-        if not is_on_feed:
-            logger.info("Not on main feed, navigating to Instagram base URL.")
+        # Viewer left open by a previous call: nothing to navigate or click.
+        # The viewer always lives on a /stories/ URL; post modals and other
+        # dialogs also have a Close button. is_visible() answers immediately.
+        try:
+            if "/stories/" in page.url and await self._locator("stories", "close").is_visible():
+                logger.info("Story viewer already open, skipping navigation.")
+                return "Stories already open."
+        except Exception as e:
+            logger.debug("Story viewer pre-check failed, opening normally: %s", e)
+
+        # --- Navigate to feed if needed ---
+        if not _is_feed_url(page.url):
+            logger.info("Not on main feed, returning to Instagram feed.")
             try:
-                # Use domcontentloaded and wait for feed content
-                await page.goto("https://www.instagram.com/", wait_until="domcontentloaded", timeout=30000)
-                await page.locator(self.selectors["feed"]["content"]).wait_for(state="visible", timeout=15000)
+                await self._return_to_feed(page)
                 logger.info("Navigated to feed and confirmed content.")
             except Exception as nav_e:
                 logger.error("Failed to navigate to feed: %s", nav_e)
@@ -382,21 +640,22 @@ class InstagramServer:
         # --- End Navigation Logic ---
 
         try:
-            story_btn_locator = self.selectors["stories"]["first"]
-            logger.info("Looking for the first story ring button using selector: %s", story_btn_locator)
-            story_btn = page.locator(story_btn_locator)
+            logger.info(
+                "Looking for the first story ring button using selector: %s",
+                self.selectors["stories"]["first"],
+            )
+            story_btn = self._locator("stories", "first").first
 
             # Wait for the first story button to be visible
-            await story_btn.first.wait_for(state="visible", timeout=15000)
+            await story_btn.wait_for(state="visible", timeout=15000)
             logger.debug("First story button visible. Clicking...")
             await asyncio.sleep(random.uniform(0.1, 0.3))
-            await story_btn.first.click(timeout=5000)
+            await story_btn.click(timeout=5000)
             logger.info("Clicked the first story element.")
 
             # Wait for story viewer using close button presence
-            close_btn_locator = self.selectors["stories"]["close"]
             logger.debug("Waiting for story viewer to open (checking for close button)...")
-            close_btn = page.locator(close_btn_locator)
+            close_btn = self._locator("stories", "close")
             await close_btn.wait_for(state="visible", timeout=35000) # Generous timeout
 
             logger.info("Stories opened successfully (close button found).")
@@ -413,10 +672,9 @@ class InstagramServer:
 
     async def _check_story_viewer_open(self) -> bool:
         # Replaced with provided implementation
-        page = self._ensure_page() # Ensure page exists
         logger.debug("Checking if story viewer is open...")
         try:
-            close_btn = page.locator(self.selectors["stories"]["close"])
+            close_btn = self._locator("stories", "close")
             # Use wait_for with a short timeout to check presence
             await close_btn.wait_for(state="visible", timeout=1500)
             logger.debug("Story viewer check: Close button found. Assuming open.")
@@ -465,31 +723,25 @@ class InstagramServer:
 
     async def pause_story(self) -> str:
         # Refactored to use direct Playwright calls
-        page = self._ensure_page()
+        self._ensure_page()
         logger.info("Attempting to pause story...")
         if not await self._check_story_viewer_open():
             return "Cannot pause story: Story viewer not open."
 
-        pause_selector = self.selectors["stories"]["pause"]
-        play_selector = self.selectors["stories"]["play"]
+        pause_locator = self._locator("stories", "pause")
+        play_locator = self._locator("stories", "play")
 
         try:
-            play_locator = page.locator(play_selector)
-            if await play_locator.is_visible(timeout=500):
+            if await play_locator.is_visible():
                 logger.info("Story is already paused (Play button visible).")
                 return "Story already paused."
 
-            logger.debug("Looking for pause button...")
-            pause_locator = page.locator(pause_selector)
-            await pause_locator.wait_for(state="visible", timeout=3000)
-            logger.debug("Pause button visible. Clicking...")
-            await pause_locator.click(timeout=3000)
-
-            await asyncio.sleep(0.3) # Wait for UI update
+            logger.debug("Clicking pause button...")
+            await pause_locator.click(timeout=6000) # Auto-waits for the button
 
             # Verify by checking if play button appeared
             logger.debug("Verifying pause by looking for play button...")
-            await play_locator.wait_for(state="visible", timeout=1000)
+            await play_locator.wait_for(state="visible", timeout=1500)
             logger.info("Verified story paused (Play button appeared).")
             return "Story paused successfully."
 
@@ -497,8 +749,7 @@ class InstagramServer:
             logger.error("Timeout error during pause action: %s", e)
             # Check if verification failed but action might have succeeded
             try:
-                play_locator = page.locator(play_selector)
-                if await play_locator.is_visible(timeout=500):
+                if await play_locator.is_visible():
                     logger.warning("Pause confirmation timed out, but play button IS visible now.")
                     return "Story likely paused, but confirmation timed out."
             except: pass
@@ -509,31 +760,25 @@ class InstagramServer:
 
     async def resume_story(self) -> str:
         # Refactored to use direct Playwright calls
-        page = self._ensure_page()
+        self._ensure_page()
         logger.info("Attempting to resume story...")
         if not await self._check_story_viewer_open():
             return "Cannot resume story: Story viewer not open."
 
-        play_selector = self.selectors["stories"]["play"]
-        pause_selector = self.selectors["stories"]["pause"]
+        play_locator = self._locator("stories", "play")
+        pause_locator = self._locator("stories", "pause")
 
         try:
-            pause_locator = page.locator(pause_selector)
-            if await pause_locator.is_visible(timeout=500):
+            if await pause_locator.is_visible():
                 logger.info("Story is already playing (Pause button visible).")
                 return "Story already playing."
 
-            logger.debug("Looking for play button...")
-            play_locator = page.locator(play_selector)
-            await play_locator.wait_for(state="visible", timeout=3000)
-            logger.debug("Play button visible. Clicking...")
-            await play_locator.click(timeout=3000)
-
-            await asyncio.sleep(0.3) # Wait for UI update
+            logger.debug("Clicking play button...")
+            await play_locator.click(timeout=6000) # Auto-waits for the button
 
             # Verify by checking if pause button appeared
             logger.debug("Verifying resume by looking for pause button...")
-            await pause_locator.wait_for(state="visible", timeout=1000)
+            await pause_locator.wait_for(state="visible", timeout=1500)
             logger.info("Verified story resumed (Pause button appeared).")
             return "Story resumed successfully."
 
@@ -541,8 +786,7 @@ class InstagramServer:
             logger.error("Timeout error during resume action: %s", e)
              # Check if verification failed but action might have succeeded
             try:
-                pause_locator = page.locator(pause_selector)
-                if await pause_locator.is_visible(timeout=500):
+                if await pause_locator.is_visible():
                     logger.warning("Resume confirmation timed out, but pause button IS visible now.")
                     return "Story likely resumed, but confirmation timed out."
             except: pass
@@ -553,33 +797,27 @@ class InstagramServer:
 
     async def like_story(self) -> str:
         # Refactored to use direct Playwright calls
-        page = self._ensure_page()
+        self._ensure_page()
         logger.info("Attempting to like current story...")
         if not await self._check_story_viewer_open():
             return "Cannot like story: Story viewer not open."
 
-        like_selector = self.selectors["stories"]["like"]
-        unlike_selector = self.selectors["stories"]["unlike"]
+        like_locator = self._locator("stories", "like")
+        unlike_locator = self._locator("stories", "unlike")
 
         try:
-            unlike_locator = page.locator(unlike_selector)
-            if await unlike_locator.is_visible(timeout=1000):
+            if await unlike_locator.is_visible():
                 logger.warning(
                     "Story appears to be already liked (Unlike button/icon found)."
                 )
                 return "Story already liked."
 
-            logger.debug("Looking for like button/icon...")
-            like_locator = page.locator(like_selector)
-            await like_locator.wait_for(state="visible", timeout=5000) # Wait for it
-            logger.debug("Like button/icon visible. Clicking...")
-            await like_locator.click(timeout=3000) # Click it
-
-            await asyncio.sleep(random.uniform(0.5, 1.0)) # Wait for UI update
+            logger.debug("Clicking like button/icon...")
+            await like_locator.click(timeout=8000) # Auto-waits for the icon
 
             # Verify by checking if unlike button appeared
             logger.debug("Verifying like by looking for unlike button/icon...")
-            await unlike_locator.wait_for(state="visible", timeout=2000)
+            await unlike_locator.wait_for(state="visible", timeout=3000)
             logger.info(
                 "Verified story liked successfully (Unlike button/icon appeared)."
             )
@@ -589,8 +827,7 @@ class InstagramServer:
             logger.error("Timeout error during story like action: %s", e)
             # Check if verification failed but action might have succeeded
             try:
-                unlike_locator = page.locator(unlike_selector)
-                if await unlike_locator.is_visible(timeout=500):
+                if await unlike_locator.is_visible():
                     logger.warning("Story like confirmation timed out, but unlike button IS visible now.")
                     return "Story likely liked, but confirmation timed out."
             except: pass
@@ -604,13 +841,12 @@ class InstagramServer:
     async def reply_to_story(self, reply_text: str) -> str:
         # Replaced with provided implementation, added try/except and logging
         page = self._ensure_page()
-        logger.info(f"Attempting to reply to current story with text: '{reply_text}'")
+        logger.info("Attempting to reply to current story with text: '%s'", reply_text)
         if not await self._check_story_viewer_open():
             return "Cannot reply to story: Story viewer not open."
 
         try:
-            reply_input_selector = self.selectors["stories"]["reply_input"]
-            reply_input = page.locator(reply_input_selector)
+            reply_input = self._locator("stories", "reply_input")
 
             await reply_input.wait_for(state="visible", timeout=10000)
             logger.debug("Story reply input visible. Filling text...")
@@ -637,31 +873,29 @@ class InstagramServer:
 
     async def close_story_viewer(self) -> str:
         # Refactored to use direct Playwright calls
-        page = self._ensure_page()
+        self._ensure_page()
         logger.info("Attempting to close story viewer...")
         if not await self._check_story_viewer_open():
             # Log slightly differently if check returns false vs button not found later
             logger.info("Story viewer check indicated it was already closed.")
             return "Story viewer was not open."
 
-        close_button_selector = self.selectors["stories"]["close"]
         try:
-            close_locator = page.locator(close_button_selector)
-            logger.debug("Looking for close button...")
-            await close_locator.wait_for(state="visible", timeout=5000)
-            logger.debug("Close button visible. Clicking...")
-            await close_locator.click(timeout=3000)
-
-            await asyncio.sleep(0.5) # Wait for close animation/state change
-
-            # Verify by checking if the viewer is NOT open anymore
-            if not await self._check_story_viewer_open():
-                 logger.info("Verified story viewer closed.")
-                 return "Story viewer closed successfully."
-            else:
-                 logger.warning("Clicked close, but story viewer still seems open.")
-                 # Attempt click again? Or just report failure.
-                 return "Clicked close button, but viewer may still be open."
+            close_locator = self._locator("stories", "close")
+            # The viewer check above just saw the button visible; click() still
+            # auto-waits for actionability, so no second visibility wait
+            logger.debug("Clicking close button...")
+            await close_locator.click(timeout=5000)
+
+            # Verify by waiting for the close button to go away, which returns
+            # as soon as the viewer is dismissed instead of sleeping blindly
+            try:
+                await close_locator.wait_for(state="hidden", timeout=3000)
+                logger.info("Verified story viewer closed.")
+                return "Story viewer closed successfully."
+            except PlaywrightTimeoutError:
+                logger.warning("Clicked close, but story viewer still seems open.")
+                return "Clicked close button, but viewer may still be open."
 
         except PlaywrightTimeoutError:
             logger.error("Failed to find or click the story viewer close button (Timeout).")